@@ -9,13 +9,178 @@ Author: AI Assistant
 Version: 1.0.0
 """
 
+import asyncio
 import json
 import logging
+import os
 import re
+import time
 from datetime import datetime
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
+try:
+    import ahocorasick  # type: ignore
+except Exception:  # pragma: no cover - optional speedup dependency
+    ahocorasick = None
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional speedup dependency
+    orjson = None
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover - optional speedup dependency
+    np = None
+
+
+# Pre-compiled patterns: compiling once at import time keeps the per-call
+# cost to a single match instead of a compile-cache lookup on every prompt.
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Single anchored alternation strips a leading filler word in one pass
+_FILLER_RE = re.compile(r'^(?:please|can you|could you|i need|i want)\s+', re.IGNORECASE)
+
+_QUESTION_PATTERNS = [
+    r'what (?:is|are|was|were) (.+?)(?:\?|$)',
+    r'how (?:do|does|can|should) (.+?)(?:\?|$)',
+    r'why (?:is|are|does) (.+?)(?:\?|$)',
+    r'explain (.+?)(?:\?|$)',
+    r'describe (.+?)(?:\?|$)',
+    r'compare (.+?)(?:\?|$)',
+    r'analyze (.+?)(?:\?|$)'
+]
+# Compiled without IGNORECASE: matching runs against the pre-lowercased
+# prompt, which spares the engine its case-folding states
+_QUESTION_RES = [re.compile(pattern) for pattern in _QUESTION_PATTERNS]
+
+# Cheap substring pre-check: a prompt can only match a question pattern if
+# it contains one of these trigger words, so most prompts skip the regex loop.
+_QUESTION_TRIGGERS = ("what", "how", "why", "explain", "describe", "compare", "analyze")
+
+# Immutable lookup structures, built once at import so every instance (and
+# every forked Uvicorn worker) shares them instead of rebuilding per __init__.
+
+# Default JSON template structure
+JSON_TEMPLATE = {
+    "context": "",
+    "problem": "",
+    "expected_solution": "",
+    "output_format": ""
+}
+
+# Common output formats for better AI responses
+OUTPUT_FORMATS = [
+    "detailed explanation",
+    "bullet points",
+    "step-by-step guide",
+    "comparative analysis",
+    "summary",
+    "code example",
+    "table format",
+    "essay format"
+]
+
+# Keywords to help determine context
+CONTEXT_KEYWORDS = {
+    "technical": ["code", "programming", "algorithm", "software", "development"],
+    "educational": ["explain", "teach", "learn", "understand", "concept"],
+    "creative": ["write", "story", "poem", "creative", "imagine"],
+    "analytical": ["analyze", "compare", "evaluate", "assess", "critique"],
+    "business": ["strategy", "business", "marketing", "finance", "management"]
+}
+
+# Keywords that signal an explicit output format request
+FORMAT_KEYWORDS = {
+    "bullet": "bullet points",
+    "list": "bullet points",
+    "step": "step-by-step guide",
+    "table": "table format",
+    "compare": "comparative analysis",
+    "summary": "summary",
+    "code": "code example",
+    "essay": "essay format"
+}
+
+# Expected solution approach per context
+CONTEXT_APPROACHES = {
+    "technical": "Provide technical explanation with examples and best practices",
+    "educational": "Give clear, step-by-step explanation suitable for learning",
+    "creative": "Offer creative suggestions and examples",
+    "analytical": "Present detailed analysis with pros/cons and conclusions",
+    "business": "Focus on practical applications and business value",
+    "general": "Provide comprehensive information covering key aspects"
+}
+
+# Default output format per context
+CONTEXT_FORMATS = {
+    "technical": "detailed explanation",
+    "educational": "step-by-step guide",
+    "creative": "essay format",
+    "analytical": "comparative analysis",
+    "business": "summary",
+    "general": "detailed explanation"
+}
+
+_CATEGORIES = list(CONTEXT_KEYWORDS)
+
+
+def _build_keyword_index():
+    """Map each context keyword to a flat index and its category index so
+    scoring can run as one np.bincount over match indices."""
+    keyword_index = {}
+    kw_to_cat = []
+    for cat_idx, keywords in enumerate(CONTEXT_KEYWORDS.values()):
+        for keyword in keywords:
+            keyword_index[keyword] = len(kw_to_cat)
+            kw_to_cat.append(cat_idx)
+    if np is not None:
+        kw_to_cat = np.asarray(kw_to_cat, dtype=np.int32)
+    return keyword_index, kw_to_cat
+
+
+_KEYWORD_INDEX, _KW_TO_CAT = _build_keyword_index()
+
+
+def _build_keyword_automaton():
+    """Build a single Aho-Corasick automaton over all context and format
+    keywords so detection takes one linear pass over the prompt instead of
+    one scan per keyword. Returns None when pyahocorasick is not installed."""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for keywords in CONTEXT_KEYWORDS.values():
+        for keyword in keywords:
+            automaton.add_word(keyword, keyword)
+    for keyword in FORMAT_KEYWORDS:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+# Last whole second and its formatted ISO prefix, reused across calls
+_iso_cache = (0, "")
+
+
+def _fast_iso(ts: float) -> str:
+    """
+    Format a unix timestamp as an ISO-8601 string without building a full
+    datetime per call: the per-second prefix is cached and only the
+    microseconds are formatted fresh, which keeps timestamping cheap in
+    bursts of enhancements.
+    """
+    global _iso_cache
+    second = int(ts)
+    cached_second, prefix = _iso_cache
+    if second != cached_second or not prefix:
+        prefix = datetime.fromtimestamp(second).isoformat()
+        _iso_cache = (second, prefix)
+    return f"{prefix}.{int((ts - second) * 1_000_000):06d}"
+
 
 class PromptToJSONEnhancer:
     """
@@ -25,63 +190,57 @@ class PromptToJSONEnhancer:
     them into a structured format that improves AI response quality.
     """
     
-    def __init__(self, log_file: str = "logs/prompt_enhancer.log"):
+    def __init__(self, log_file: str = "logs/prompt_enhancer.log",
+                 output_dir: str = "enhanced_prompts"):
         """
         Initialize the Prompt-to-JSON Enhancer.
-        
+
         Args:
             log_file (str): Path to the log file for tracking operations
+            output_dir (str): Directory where enhanced prompts are saved
         """
         self.log_file = log_file
         self.setup_logging()
-        
-        # Define default JSON template structure
-        self.json_template = {
-            "context": "",
-            "problem": "",
-            "expected_solution": "",
-            "output_format": ""
-        }
-        
-        # Common output formats for better AI responses
-        self.output_formats = [
-            "detailed explanation",
-            "bullet points",
-            "step-by-step guide",
-            "comparative analysis",
-            "summary",
-            "code example",
-            "table format",
-            "essay format"
-        ]
-        
-        # Keywords to help determine context
-        self.context_keywords = {
-            "technical": ["code", "programming", "algorithm", "software", "development"],
-            "educational": ["explain", "teach", "learn", "understand", "concept"],
-            "creative": ["write", "story", "poem", "creative", "imagine"],
-            "analytical": ["analyze", "compare", "evaluate", "assess", "critique"],
-            "business": ["strategy", "business", "marketing", "finance", "management"]
-        }
-        
+
+        # Create the output directory once up front so save_enhanced_prompt
+        # doesn't pay a stat/mkdir syscall pair on every write
+        self._out_dir = Path(output_dir)
+        self._out_dir.mkdir(parents=True, exist_ok=True)
+
+        # Aliases to the shared module-level structures, kept for backward
+        # compatibility; the instance itself only owns logging state
+        self.json_template = JSON_TEMPLATE
+        self.output_formats = OUTPUT_FORMATS
+        self.context_keywords = CONTEXT_KEYWORDS
+        self.format_keywords = FORMAT_KEYWORDS
+
         self.logger.info("Prompt-to-JSON Enhancer initialized successfully")
     
     def setup_logging(self):
-        """Set up logging configuration for tracking operations and errors."""
+        """Set up logging configuration for tracking operations and errors.
+
+        Uses a named logger per log file and only attaches handlers the first
+        time, so repeated instantiations (tests, reloads, multiple workers)
+        don't stack duplicate handlers or mutate the root logger.
+        """
         # Create logs directory if it doesn't exist
         log_dir = Path(self.log_file).parent
         log_dir.mkdir(exist_ok=True)
-        
-        # Configure logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.log_file),
-                logging.StreamHandler()  # Also log to console
-            ]
-        )
-        self.logger = logging.getLogger(__name__)
+
+        self.logger = logging.getLogger(f"p2j.{self.log_file}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False  # avoid double-logging through root
+
+        if not self.logger.handlers:
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            handlers = [logging.FileHandler(self.log_file)]
+            # Console output can be disabled in production (each StreamHandler
+            # record costs a flush/write syscall)
+            if os.getenv("PROMPT_ENHANCER_LOG_CONSOLE", "1") == "1":
+                handlers.append(logging.StreamHandler())  # Also log to console
+            for handler in handlers:
+                handler.setFormatter(formatter)
+                self.logger.addHandler(handler)
     
     def analyze_prompt(self, prompt: str) -> Dict[str, str]:
         """
@@ -93,22 +252,23 @@ class PromptToJSONEnhancer:
         Returns:
             Dict[str, str]: Dictionary containing extracted components
         """
-        self.logger.info(f"Analyzing prompt: {prompt[:50]}...")
+        self.logger.info("Analyzing prompt: %s...", prompt[:50])
         
-        # Clean and normalize the prompt
+        # Clean and normalize the prompt, lowercasing once for every analyzer
         cleaned_prompt = self.clean_prompt(prompt)
-        
+        prompt_lower = cleaned_prompt.lower()
+
         # Extract context based on keywords
-        context = self.detect_context(cleaned_prompt)
-        
+        context = self.detect_context(cleaned_prompt, prompt_lower)
+
         # Identify the main problem/question
-        problem = self.extract_problem(cleaned_prompt)
-        
+        problem = self.extract_problem(cleaned_prompt, prompt_lower)
+
         # Determine expected solution approach
         expected_solution = self.determine_solution_approach(cleaned_prompt, context)
-        
+
         # Suggest appropriate output format
-        output_format = self.suggest_output_format(cleaned_prompt, context)
+        output_format = self.suggest_output_format(cleaned_prompt, context, prompt_lower)
         
         result = {
             "context": context,
@@ -117,7 +277,7 @@ class PromptToJSONEnhancer:
             "output_format": output_format
         }
         
-        self.logger.info(f"Analysis complete. Context: {context}, Format: {output_format}")
+        self.logger.info("Analysis complete. Context: %s, Format: %s", context, output_format)
         return result
     
     def clean_prompt(self, prompt: str) -> str:
@@ -131,67 +291,106 @@ class PromptToJSONEnhancer:
             str: Cleaned prompt
         """
         # Remove extra whitespace and normalize
-        cleaned = re.sub(r'\s+', ' ', prompt.strip())
-        
-        # Remove common filler words that don't add value
-        filler_words = ["please", "can you", "could you", "i need", "i want"]
-        for word in filler_words:
-            cleaned = re.sub(f'^{word}\\s+', '', cleaned, flags=re.IGNORECASE)
-        
-        self.logger.debug(f"Cleaned prompt: {cleaned}")
+        cleaned = _WHITESPACE_RE.sub(' ', prompt.strip())
+
+        # Remove common filler words that don't add value; a second pass
+        # covers stacked fillers like "please can you"
+        for _ in range(2):
+            stripped = _FILLER_RE.sub('', cleaned, count=1)
+            if stripped == cleaned:
+                break
+            cleaned = stripped
+        
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Cleaned prompt: %s", cleaned)
         return cleaned
     
-    def detect_context(self, prompt: str) -> str:
+    def _scan_keywords(self, prompt_lower: str) -> set:
+        """
+        Collect every known context/format keyword present in the prompt.
+
+        Args:
+            prompt_lower (str): Lowercased prompt text
+
+        Returns:
+            set: Keywords found anywhere in the prompt
+        """
+        if _KEYWORD_AUTOMATON is not None:
+            # One linear pass over the prompt covers all keywords at once
+            return {keyword for _, keyword in _KEYWORD_AUTOMATON.iter(prompt_lower)}
+
+        # Fallback: per-keyword substring scan
+        all_keywords = set(FORMAT_KEYWORDS)
+        for keywords in CONTEXT_KEYWORDS.values():
+            all_keywords.update(keywords)
+        return {keyword for keyword in all_keywords if keyword in prompt_lower}
+
+    def detect_context(self, prompt: str, prompt_lower: Optional[str] = None) -> str:
         """
         Detect the context/category of the prompt based on keywords.
-        
+
         Args:
             prompt (str): Cleaned prompt text
-            
+            prompt_lower (str): Optional pre-lowercased prompt, computed here
+                when not supplied
+
         Returns:
             str: Detected context category
         """
-        prompt_lower = prompt.lower()
-        
-        # Count keyword matches for each context
+        if prompt_lower is None:
+            prompt_lower = prompt.lower()
+        matched = self._scan_keywords(prompt_lower)
+
+        if np is not None:
+            # Vectorized tally: map matched keywords to category indices and
+            # count them in one bincount; argmax keeps category order for ties
+            hits = np.fromiter(
+                (_KEYWORD_INDEX[kw] for kw in matched if kw in _KEYWORD_INDEX),
+                dtype=np.int32,
+            )
+            if hits.size:
+                scores = np.bincount(_KW_TO_CAT[hits], minlength=len(_CATEGORIES))
+                return _CATEGORIES[int(scores.argmax())]
+            return "general"
+
+        # Fallback: count keyword matches for each context in Python
         context_scores = {}
-        for context, keywords in self.context_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in prompt_lower)
+        for context, keywords in CONTEXT_KEYWORDS.items():
+            score = sum(1 for keyword in keywords if keyword in matched)
             context_scores[context] = score
-        
+
         # Return the context with highest score, or 'general' if no clear match
         if context_scores:
             best_context = max(context_scores, key=context_scores.get)
             if context_scores[best_context] > 0:
                 return best_context
-        
+
         return "general"
     
-    def extract_problem(self, prompt: str) -> str:
+    def extract_problem(self, prompt: str, prompt_lower: Optional[str] = None) -> str:
         """
         Extract the main problem or question from the prompt.
-        
+
         Args:
             prompt (str): Cleaned prompt text
-            
+            prompt_lower (str): Optional pre-lowercased prompt, computed here
+                when not supplied
+
         Returns:
             str: Extracted problem statement
         """
-        # Look for question patterns
-        question_patterns = [
-            r'what (?:is|are|was|were) (.+?)(?:\?|$)',
-            r'how (?:do|does|can|should) (.+?)(?:\?|$)',
-            r'why (?:is|are|does) (.+?)(?:\?|$)',
-            r'explain (.+?)(?:\?|$)',
-            r'describe (.+?)(?:\?|$)',
-            r'compare (.+?)(?:\?|$)',
-            r'analyze (.+?)(?:\?|$)'
-        ]
-        
-        for pattern in question_patterns:
-            match = re.search(pattern, prompt, re.IGNORECASE)
+        # Skip the regex loop entirely when no trigger word is present
+        if prompt_lower is None:
+            prompt_lower = prompt.lower()
+        if not any(trigger in prompt_lower for trigger in _QUESTION_TRIGGERS):
+            return prompt
+
+        # Look for question patterns on the lowered text, then slice the
+        # original prompt by span so the extracted problem keeps its case
+        for question_re in _QUESTION_RES:
+            match = question_re.search(prompt_lower)
             if match:
-                return match.group(1).strip()
+                return prompt[match.start(1):match.end(1)].strip()
         
         # If no specific pattern found, return the original prompt
         return prompt
@@ -207,56 +406,32 @@ class PromptToJSONEnhancer:
         Returns:
             str: Expected solution approach
         """
-        context_approaches = {
-            "technical": "Provide technical explanation with examples and best practices",
-            "educational": "Give clear, step-by-step explanation suitable for learning",
-            "creative": "Offer creative suggestions and examples",
-            "analytical": "Present detailed analysis with pros/cons and conclusions",
-            "business": "Focus on practical applications and business value",
-            "general": "Provide comprehensive information covering key aspects"
-        }
-        
-        return context_approaches.get(context, context_approaches["general"])
+        return CONTEXT_APPROACHES.get(context, CONTEXT_APPROACHES["general"])
     
-    def suggest_output_format(self, prompt: str, context: str) -> str:
+    def suggest_output_format(self, prompt: str, context: str,
+                              prompt_lower: Optional[str] = None) -> str:
         """
         Suggest appropriate output format based on prompt and context.
-        
+
         Args:
             prompt (str): Cleaned prompt text
             context (str): Detected context
-            
+            prompt_lower (str): Optional pre-lowercased prompt, computed here
+                when not supplied
+
         Returns:
             str: Suggested output format
         """
         # Check for specific format requests
-        format_keywords = {
-            "bullet": "bullet points",
-            "list": "bullet points",
-            "step": "step-by-step guide",
-            "table": "table format",
-            "compare": "comparative analysis",
-            "summary": "summary",
-            "code": "code example",
-            "essay": "essay format"
-        }
-        
-        prompt_lower = prompt.lower()
-        for keyword, format_type in format_keywords.items():
-            if keyword in prompt_lower:
+        if prompt_lower is None:
+            prompt_lower = prompt.lower()
+        matched = self._scan_keywords(prompt_lower)
+        for keyword, format_type in FORMAT_KEYWORDS.items():
+            if keyword in matched:
                 return format_type
-        
+
         # Default formats based on context
-        context_formats = {
-            "technical": "detailed explanation",
-            "educational": "step-by-step guide",
-            "creative": "essay format",
-            "analytical": "comparative analysis",
-            "business": "summary",
-            "general": "detailed explanation"
-        }
-        
-        return context_formats.get(context, "detailed explanation")
+        return CONTEXT_FORMATS.get(context, "detailed explanation")
     
     def enhance_prompt(self, prompt: str) -> Dict[str, any]:
         """
@@ -284,7 +459,7 @@ class PromptToJSONEnhancer:
                     "output_format": analysis["output_format"]
                 },
                 "metadata": {
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": _fast_iso(time.time()),
                     "enhancement_version": "1.0.0",
                     "processing_time": "N/A"  # Could add timing if needed
                 }
@@ -294,7 +469,7 @@ class PromptToJSONEnhancer:
             return enhanced_prompt
             
         except Exception as e:
-            self.logger.error(f"Error enhancing prompt: {str(e)}")
+            self.logger.error("Error enhancing prompt: %s", str(e))
             raise
     
     def format_json_output(self, enhanced_prompt: Dict[str, any], pretty: bool = True) -> str:
@@ -308,6 +483,9 @@ class PromptToJSONEnhancer:
         Returns:
             str: Formatted JSON string
         """
+        if orjson is not None:
+            option = orjson.OPT_INDENT_2 if pretty else 0
+            return orjson.dumps(enhanced_prompt, option=option).decode()
         if pretty:
             return json.dumps(enhanced_prompt, indent=2, ensure_ascii=False)
         else:
@@ -326,19 +504,56 @@ class PromptToJSONEnhancer:
         """
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"enhanced_prompts/enhanced_prompt_{timestamp}.json"
-        
-        # Create directory if it doesn't exist
+            filename = str(self._out_dir / f"enhanced_prompt_{timestamp}.json")
+
+        # The default output directory was created at init; only custom
+        # filenames pointing elsewhere still need their directory created
         file_path = Path(filename)
-        file_path.parent.mkdir(exist_ok=True)
-        
+        if file_path.parent != self._out_dir:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+
         # Save the file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(enhanced_prompt, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            with open(file_path, 'wb') as f:
+                f.write(orjson.dumps(enhanced_prompt, option=orjson.OPT_INDENT_2))
+        else:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(enhanced_prompt, f, indent=2, ensure_ascii=False)
         
-        self.logger.info(f"Enhanced prompt saved to: {filename}")
+        self.logger.info("Enhanced prompt saved to: %s", filename)
         return str(file_path)
 
+    async def save_enhanced_prompt_async(self, enhanced_prompt: Dict[str, any],
+                                         filename: str = None) -> str:
+        """
+        Async variant of save_enhanced_prompt for use inside request handlers.
+
+        Offloads the blocking file write to a worker thread so the event loop
+        stays free while the save completes.
+
+        Args:
+            enhanced_prompt (Dict[str, any]): Enhanced prompt to save
+            filename (str): Optional custom filename
+
+        Returns:
+            str: Path to saved file
+        """
+        return await asyncio.to_thread(self.save_enhanced_prompt, enhanced_prompt, filename)
+
+
+@lru_cache(maxsize=1)
+def get_enhancer(log_file: str = "logs/prompt_enhancer.log") -> PromptToJSONEnhancer:
+    """
+    Return the process-wide PromptToJSONEnhancer instance.
+
+    Args:
+        log_file (str): Path to the log file for tracking operations
+
+    Returns:
+        PromptToJSONEnhancer: The shared enhancer, created on first use
+    """
+    return PromptToJSONEnhancer(log_file=log_file)
+
 
 def main():
     """